@@ -1,9 +1,11 @@
 import os
+import uuid
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import render_template, request, send_from_directory, jsonify
+from flask import render_template, request, send_from_directory, jsonify, abort
 from flask_cors import CORS
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from app_factory import app_factory, app
 
@@ -20,6 +22,11 @@ for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, DOWNLOAD_FOLDER]:
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 
+# Response options for /process
+RESPONSE_FIELDS = ('extracted_text', 'summary', 'download_url', 'ocr_confidence')
+# Extracted text larger than this is stored once and returned by URL instead of inline
+INLINE_TEXT_LIMIT = int(os.environ.get('INLINE_TEXT_LIMIT', 256 * 1024))
+
 # Optional: Health check route for Render
 @app.route('/healthz')
 def healthz():
@@ -38,23 +45,40 @@ def process():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
+    # Callers can pick the fields they need, e.g. fields=summary,download_url
+    fields = request.values.get('fields')
+    fields = {f.strip() for f in fields.split(',')} if fields else set(RESPONSE_FIELDS)
+    unknown = fields - set(RESPONSE_FIELDS)
+    if unknown:
+        return jsonify({
+            "error": f"Unknown fields: {', '.join(sorted(unknown))}. Expected any of: {', '.join(RESPONSE_FIELDS)}"
+        }), 400
+
     filename = secure_filename(file.filename)
     input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(input_path)
 
     _, ext = os.path.splitext(filename.lower())
+    # Adaptive OCR: low-DPI first pass, re-render only low-confidence pages/lines
+    adaptive = request.values.get('adaptive_ocr', os.environ.get('ADAPTIVE_OCR', 'false')).lower() in ('1', 'true', 'yes')
+    # text_output=url always returns extracted text as a downloadable resource
+    text_as_url = request.values.get('text_output') == 'url'
 
     try:
         if ext == '.pdf':
             pdf_processor = app_factory.get_pdf_processor()
-            extracted_text = pdf_processor.extract_text_with_ocr(input_path)
+            extracted_text, ocr_confidence = pdf_processor.extract_text_with_ocr(
+                input_path, adaptive=adaptive, return_confidence=True
+            )
             if not extracted_text:
                 return jsonify({"error": "Could not extract text from PDF file"}), 500
             summary = pdf_processor.summarize_text(extracted_text)
         else:
             # Assume image
             image_processor = app_factory.get_image_processor()
-            extracted_text = image_processor.extract_text_from_image(input_path)
+            extracted_text, ocr_confidence = image_processor.extract_text_from_image(
+                input_path, adaptive=adaptive, return_confidence=True
+            )
             if not extracted_text:
                 return jsonify({"error": "Could not extract text from image file"}), 500
             summary = image_processor.generate_summary(extracted_text)
@@ -62,16 +86,29 @@ def process():
         # Save summary to output folder
         output_filename = os.path.splitext(filename)[0] + "_summary.txt"
         output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-        from utils import clean_markdown
+        from utils import clean_markdown, write_text_resource
         clean_summary = clean_markdown(summary)
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(clean_summary)
 
-        return jsonify({
-            "extracted_text": extracted_text,
-            "summary": summary,
-            "download_url": f"/download/{output_filename}"
-        })
+        response = {}
+        if 'extracted_text' in fields:
+            if text_as_url or len(extracted_text) > INLINE_TEXT_LIMIT:
+                # Large text is stored once (precompressed) and fetched via /download with Range
+                # Unique per request so concurrent uploads with the same name never share it
+                text_filename = f"{os.path.splitext(filename)[0]}_text_{uuid.uuid4().hex}.txt"
+                text_path = os.path.join(OUTPUT_FOLDER, text_filename)
+                response["extracted_text_url"] = f"/download/{text_filename}"
+                response["extracted_text_bytes"] = write_text_resource(extracted_text, text_path)
+            else:
+                response["extracted_text"] = extracted_text
+        if 'summary' in fields:
+            response["summary"] = summary
+        if 'download_url' in fields:
+            response["download_url"] = f"/download/{output_filename}"
+        if 'ocr_confidence' in fields and ocr_confidence:
+            response["ocr_confidence"] = ocr_confidence
+        return jsonify(response)
     except Exception as e:
         print("Error processing file:", str(e))
         return jsonify({"error": f"Error processing file: {str(e)}"}), 500
@@ -112,7 +149,24 @@ def process_video():
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_from_directory(OUTPUT_FOLDER, filename, as_attachment=True)
+    # Serve a precompressed copy when the client accepts it. Range requests
+    # address the uncompressed bytes, so they always get the plain file.
+    # send_from_directory handles ETag, If-None-Match and Range itself.
+    if 'Range' not in request.headers:
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            compressed_path = safe_join(OUTPUT_FOLDER, filename + suffix)
+            # Membership ignores q-values, so check the quality: 'gzip;q=0' means refused
+            if request.accept_encodings[encoding] > 0 and compressed_path and os.path.exists(compressed_path):
+                response = send_from_directory(OUTPUT_FOLDER, filename + suffix, as_attachment=True,
+                                               download_name=filename, mimetype='text/plain')
+                response.headers['Content-Encoding'] = encoding
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+    if filename.endswith(('.gz', '.br')):
+        abort(404)
+    response = send_from_directory(OUTPUT_FOLDER, filename, as_attachment=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 def main():
     port = int(os.environ.get("PORT", 10000))
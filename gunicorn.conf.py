@@ -4,7 +4,7 @@ import multiprocessing
 # Server socket
 bind = "0.0.0.0:10000"
 
-# Worker processes
+# Worker processes (measure alternatives with `python -m loadtest`, see README)
 workers = 2
 threads = 2
 worker_class = 'gthread'
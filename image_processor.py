@@ -1,16 +1,26 @@
 import os
 import pytesseract
 from PIL import Image
-from utils import setup_tesseract, summarize_text
+from utils import (
+    setup_tesseract, summarize_text, adaptive_ocr, ocr_text_regions, detect_ocr_language,
+    OCR_IMAGE_LOW_MAX_SIDE, OCR_DEFAULT_LANGUAGE
+)
 
 class TextExtractorAndSummarizer:
     def __init__(self):
         setup_tesseract(pytesseract)
 
-    def extract_text_from_image(self, image_path):
+    def extract_text_from_image(self, image_path, adaptive=False, return_confidence=False):
         """
-        Extract text from an image using Tesseract OCR
+        Extract text from an image using Tesseract OCR.
+        With `adaptive`, large images are OCR'd downscaled first and only
+        low-confidence lines (or the whole image) are retried at a higher scale.
+        With `return_confidence`, returns (text, confidence dict).
+        Both modes use the language pack for the detected script. Without
+        `adaptive`, only detected text blocks are OCR'd; adaptive mode OCRs the
+        whole image, since it already finds weak lines itself.
         """
+        confidence = None
         try:
             if not os.path.exists(pytesseract.pytesseract.tesseract_cmd):
                 raise Exception(f"Tesseract not found at: {pytesseract.pytesseract.tesseract_cmd}")
@@ -19,19 +29,52 @@ class TextExtractorAndSummarizer:
             image = Image.open(image_path)
             
             # Extract text from the image
-            extracted_text = pytesseract.image_to_string(image)
+            lang = detect_ocr_language(pytesseract, image) or OCR_DEFAULT_LANGUAGE
+            if adaptive:
+                extracted_text, confidence = self._adaptive_ocr(image, lang)
+            else:
+                extracted_text = ocr_text_regions(pytesseract, image, lang=lang)
             
             if not extracted_text.strip():
                 print("Warning: No text was extracted from the image")
-                return None
-                
-            return extracted_text.strip()
+                extracted_text = None
+            else:
+                extracted_text = extracted_text.strip()
+
+            if return_confidence:
+                return extracted_text, confidence
+            return extracted_text
         except Exception as e:
             print(f"Error extracting text from image: {str(e)}")
             print(f"Image path: {image_path}")
             print(f"Tesseract path: {pytesseract.pytesseract.tesseract_cmd}")
+            if return_confidence:
+                return None, confidence
             return None
 
+    def _adaptive_ocr(self, image, lang):
+        # Downscale large scans for the first pass; small images get upscaled on retry
+        low_scale = min(1.0, OCR_IMAGE_LOW_MAX_SIDE / max(image.size))
+        high_scale = 1.0 if low_scale < 1.0 else 2.0
+
+        def render(scale, clip):
+            if clip:
+                left, top, right, bottom = clip
+                region = image.crop((round(left), round(top),
+                                     min(image.width, round(right)), min(image.height, round(bottom))))
+            else:
+                region = image
+            if scale != 1.0:
+                size = (max(1, round(region.width * scale)), max(1, round(region.height * scale)))
+                region = region.resize(size, Image.LANCZOS)
+            return region
+
+        text, info = adaptive_ocr(pytesseract, render, low_scale, high_scale, lang=lang)
+        info["scale"] = high_scale if info["rerendered"] == "page" else low_scale
+        if info["rerendered"] == "regions":
+            info["region_scale"] = high_scale
+        return text, info
+
     def generate_summary(self, text):
         """
         Generate a professional summary using the centralized utility.
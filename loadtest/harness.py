@@ -0,0 +1,473 @@
+"""
+Load-test harness and capacity report for the gunicorn deployment.
+
+Starts the app under gunicorn (via loadtest.stub_app) with local stand-ins
+for Gemini and YouTube, drives a mixed PDF/image/video workload at
+controlled Poisson arrival rates, and records throughput, tail latency,
+error/timeout rates and RSS per worker (including its Tesseract/FFmpeg
+subprocesses) for each worker configuration.
+
+    python -m loadtest --configs 2x2:gthread,4x1:sync --rates 0.25,0.5,1 --duration 60
+"""
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_TIMEOUT = 120  # Matches gunicorn.conf.py
+CLIENT_TIMEOUT = SERVER_TIMEOUT + 30  # Let worker timeouts surface before the client gives up
+WORKLOADS = ('pdf', 'scanned_pdf', 'image', 'video', 'youtube')
+DEFAULT_MIX = 'pdf=3,scanned_pdf=2,image=3,video=1,youtube=1'
+
+SAMPLE_TEXT = (
+    "Quarterly results show revenue growth across all regions. "
+    "Operating costs fell as the new logistics platform rolled out. "
+    "The board approved further investment in research and development. "
+    "Customer retention improved for the third consecutive quarter. "
+    "Management expects margins to remain stable through the next year."
+)
+
+
+# --- Fixtures -----------------------------------------------------------------
+
+def build_fixtures(folder, pdf_pages=5, audio_fixture=None, audio_seconds=10):
+    """
+    Generate the upload fixtures: a text PDF, a scanned (image-only) PDF and
+    a PNG page of text. Video/YouTube requests use `audio_fixture` when given,
+    otherwise a short generated tone.
+    Returns a dict of workload -> (filename suffix, bytes, path).
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image, ImageDraw, ImageFont
+
+    lines = [s.strip() + "." for s in SAMPLE_TEXT.split(".") if s.strip()] * 8
+
+    image_path = os.path.join(folder, "page.png")
+    image = Image.new("RGB", (1700, 2200), "white")
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=32)
+    except TypeError:
+        font = ImageFont.load_default()
+    for i, line in enumerate(lines):
+        draw.text((100, 100 + i * 48), line, fill="black", font=font)
+    image.save(image_path)
+
+    pdf_path = os.path.join(folder, "text.pdf")
+    doc = fitz.open()
+    for _ in range(pdf_pages):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (72, 72, -72, -72), " ".join(lines), fontsize=11)
+    doc.save(pdf_path)
+    doc.close()
+
+    scanned_path = os.path.join(folder, "scanned.pdf")
+    doc = fitz.open()
+    xref = 0
+    for _ in range(pdf_pages):
+        page = doc.new_page()
+        # Embed the image once and reference it from every page, like a real scan's size
+        xref = page.insert_image(page.rect, filename=image_path, xref=xref)
+    doc.save(scanned_path)
+    doc.close()
+
+    if audio_fixture:
+        audio_path = os.path.abspath(audio_fixture)
+    else:
+        # A tone transcribes to (almost) nothing, so summarization is mostly skipped;
+        # pass --audio-fixture with recorded speech to load the whole video pipeline
+        print("Warning: no --audio-fixture given, video requests use a generated tone")
+        audio_path = os.path.join(folder, "audio.wav")
+        rate = 16000
+        with wave.open(audio_path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(b"".join(
+                struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / rate)))
+                for i in range(rate * audio_seconds)
+            ))
+
+    fixtures = {}
+    for kind, path in (("pdf", pdf_path), ("scanned_pdf", scanned_path),
+                       ("image", image_path), ("video", audio_path), ("youtube", audio_path)):
+        with open(path, "rb") as f:
+            fixtures[kind] = (os.path.splitext(path)[1], f.read(), path)
+    return fixtures
+
+
+# --- Stand-ins ----------------------------------------------------------------
+
+class _GeminiStub(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        body = json.dumps({"candidates": [{"content": {"parts": [{
+            "text": "## Summary\n\n**Revenue** grew while *costs* fell.\n\n---\n\n- Margins stable."
+        }]}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_gemini_stub(latency):
+    handler = type("GeminiStub", (_GeminiStub,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Gunicorn -----------------------------------------------------------------
+
+def parse_config(spec):
+    """Parse 'WORKERSxTHREADS[:CLASS]', e.g. '2x2:gthread' or '4x1:sync'."""
+    sizes, _, worker_class = spec.partition(":")
+    workers, _, threads = sizes.partition("x")
+    return int(workers), int(threads or 1), worker_class or "gthread"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(config, workdir, env):
+    workers, threads, worker_class = config
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "--config", os.path.join(REPO_ROOT, "gunicorn.conf.py"),
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        "--threads", str(threads),
+        "--worker-class", worker_class,
+        "--timeout", str(SERVER_TIMEOUT),
+        "loadtest.stub_app:app",
+    ]
+    log = open(os.path.join(workdir, f"gunicorn_{workers}x{threads}_{worker_class}.log"), "w")
+    process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited early, see {log.name}")
+        try:
+            if requests.get(base_url + "/healthz", timeout=2).status_code == 200:
+                return process, base_url, log
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    stop_server(process, log)
+    raise RuntimeError(f"gunicorn did not become healthy, see {log.name}")
+
+
+def stop_server(process, log):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    log.close()
+
+
+# --- Measurement --------------------------------------------------------------
+
+def _children_by_pid():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the ")" closing the command name: state, ppid, ...
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _tree_rss_mb(pid, children):
+    # A worker's own RSS plus its Tesseract/FFmpeg subprocesses (and theirs)
+    total = _rss_mb(pid) or 0
+    for child in children.get(pid, []):
+        total += _tree_rss_mb(child, children)
+    return total
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """
+    Samples RSS of every gunicorn worker including its subprocesses, plus the
+    gunicorn master itself (Linux /proc only).
+    """
+
+    def __init__(self, master_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks = {}
+        self.master_peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if not os.path.isdir("/proc"):
+            return
+        while not self._stop_event.is_set():
+            children = _children_by_pid()
+            self.master_peak = max(self.master_peak, _rss_mb(self.master_pid) or 0)
+            for pid in children.get(self.master_pid, []):
+                rss = _tree_rss_mb(pid, children)
+                if rss:
+                    self.peaks[pid] = max(rss, self.peaks.get(pid, 0))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def send_request(base_url, kind, fixtures, scheduled):
+    """Send one request; latency is measured from its scheduled arrival time."""
+    suffix, data, _ = fixtures[kind]
+    name = f"loadtest_{uuid.uuid4().hex}{suffix}"
+    try:
+        if kind == "youtube":
+            response = requests.post(base_url + "/process_video", timeout=CLIENT_TIMEOUT,
+                                     json={"video_source": "https://youtu.be/loadtest", "is_youtube": True})
+        elif kind == "video":
+            response = requests.post(base_url + "/process_video", timeout=CLIENT_TIMEOUT,
+                                     files={"video_file": (name, data)})
+        else:
+            response = requests.post(base_url + "/process", timeout=CLIENT_TIMEOUT,
+                                     files={"file": (name, data)})
+        ok = response.status_code == 200 and "error" not in response.json()
+        outcome = "ok" if ok else "error"
+    except requests.Timeout:
+        outcome = "timeout"
+    except (requests.RequestException, ValueError):
+        outcome = "error"
+    latency = time.monotonic() - scheduled
+    # Gunicorn kills a worker past its timeout and drops the connection
+    if outcome == "error" and latency >= SERVER_TIMEOUT:
+        outcome = "timeout"
+    return {"kind": kind, "latency": latency, "outcome": outcome}
+
+
+def run_load(base_url, fixtures, rate, duration, mix, seed=0):
+    """Open-loop load: Poisson arrivals at `rate` req/s for `duration` seconds."""
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    futures = []
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        start = time.monotonic()
+        arrival = start
+        while True:
+            arrival += rng.expovariate(rate)
+            if arrival - start > duration:
+                break
+            delay = arrival - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            kind = rng.choices(kinds, weights)[0]
+            futures.append(pool.submit(send_request, base_url, kind, fixtures, arrival))
+        results = [f.result() for f in futures]
+    return results, time.monotonic() - start
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(pct / 100 * len(values)) - 1))]
+
+
+def summarize_run(results, elapsed, rss_peaks, master_rss=None):
+    total = len(results)
+    ok = [r["latency"] for r in results if r["outcome"] == "ok"]
+    errors = sum(r["outcome"] == "error" for r in results)
+    timeouts = sum(r["outcome"] == "timeout" for r in results)
+    peaks = list(rss_peaks.values())
+    by_kind = {}
+    for kind in sorted({r["kind"] for r in results}):
+        latencies = [r["latency"] for r in results if r["kind"] == kind and r["outcome"] == "ok"]
+        by_kind[kind] = {
+            "requests": sum(r["kind"] == kind for r in results),
+            "p95": _percentile(latencies, 95),
+        }
+    return {
+        "requests": total,
+        "throughput": len(ok) / elapsed if elapsed else 0,
+        "p50": _percentile(ok, 50),
+        "p95": _percentile(ok, 95),
+        "p99": _percentile(ok, 99),
+        "error_rate": errors / total if total else 0,
+        "timeout_rate": timeouts / total if total else 0,
+        "rss_peak_mb": max(peaks) if peaks else None,
+        "rss_mean_peak_mb": sum(peaks) / len(peaks) if peaks else None,
+        "master_rss_mb": master_rss or None,
+        "by_kind": by_kind,
+    }
+
+
+# --- Report -------------------------------------------------------------------
+
+def capacity(runs, slo, max_failure_rate=0.01):
+    """
+    Highest offered rate that met the p95 SLO with an acceptable failure rate,
+    stopping at the first rate that fails so a noisy pass higher up does not
+    overstate capacity.
+    """
+    sustainable = None
+    for run in sorted(runs, key=lambda r: r["rate"]):
+        failures = run["error_rate"] + run["timeout_rate"]
+        if run["p95"] is None or run["p95"] > slo or failures > max_failure_rate:
+            break
+        sustainable = run["rate"]
+    return sustainable
+
+
+def _fmt(value, pattern="{:.2f}"):
+    return "-" if value is None else pattern.format(value)
+
+
+def format_report(report, slo, node_memory_mb=None):
+    lines = [
+        "| config | rate (req/s) | requests | throughput | p50 (s) | p95 (s) | p99 (s) | errors | timeouts | peak RSS/worker incl. subprocesses (MB) |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for entry in report:
+        for run in entry["runs"]:
+            lines.append(
+                f"| {entry['config']} | {run['rate']:g} | {run['requests']} | {run['throughput']:.2f} "
+                f"| {_fmt(run['p50'])} | {_fmt(run['p95'])} | {_fmt(run['p99'])} "
+                f"| {run['error_rate']:.1%} | {run['timeout_rate']:.1%} | {_fmt(run['rss_peak_mb'], '{:.0f}')} |"
+            )
+
+    lines += ["", f"Capacity (p95 <= {slo:g}s, failures <= 1%):", ""]
+    for entry in report:
+        line = f"- {entry['config']}: sustainable rate {_fmt(entry['sustainable_rate'], '{:g}')} req/s"
+        peak = max((run["rss_peak_mb"] or 0 for run in entry["runs"]), default=0)
+        master = max((run["master_rss_mb"] or 0 for run in entry["runs"]), default=0)
+        if node_memory_mb and peak:
+            fits = max(0, int((node_memory_mb - master) // peak))
+            line += (f", peak RSS {peak:.0f} MB/worker incl. subprocesses + {master:.0f} MB master"
+                     f" -> at most {fits} workers in {node_memory_mb} MB")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f"unknown workload '{kind}', expected one of {', '.join(WORKLOADS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--configs", default="2x2:gthread",
+                        help="Comma-separated WORKERSxTHREADS[:CLASS] configurations (default: %(default)s)")
+    parser.add_argument("--rates", default="0.25,0.5,1",
+                        help="Comma-separated arrival rates in requests/second (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load per rate (default: %(default)s)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Comma-separated WORKLOAD=WEIGHT pairs (default: %(default)s)")
+    parser.add_argument("--gemini-latency", type=float, default=1.5, help="Stub Gemini response time in seconds")
+    parser.add_argument("--youtube-latency", type=float, default=2.0, help="Stub YouTube download time in seconds")
+    parser.add_argument("--pdf-pages", type=int, default=5, help="Pages in the PDF fixtures")
+    parser.add_argument("--audio-fixture",
+                        help="Speech recording (any format FFmpeg reads) for video/YouTube requests")
+    parser.add_argument("--slo", type=float, default=30, help="p95 latency target in seconds for the capacity model")
+    parser.add_argument("--node-memory-mb", type=int, help="Node memory, to estimate how many workers fit")
+    parser.add_argument("--output", help="Also write the full report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    configs = [parse_config(spec) for spec in args.configs.split(",")]
+    rates = [float(rate) for rate in args.rates.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="summabrowse_loadtest_")
+    fixtures = build_fixtures(workdir, pdf_pages=args.pdf_pages, audio_fixture=args.audio_fixture)
+    gemini = start_gemini_stub(args.gemini_latency)
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+        GEMINI_API_KEY="loadtest",
+        GEMINI_API_URL=f"http://127.0.0.1:{gemini.server_address[1]}/v1/models/stub:generateContent",
+        LOADTEST_AUDIO_FIXTURE=fixtures["youtube"][2],
+        LOADTEST_YOUTUBE_LATENCY=str(args.youtube_latency),
+    )
+    print(f"Working directory: {workdir}")
+
+    report = []
+    try:
+        for config in configs:
+            name = f"{config[0]}x{config[1]}:{config[2]}"
+            print(f"Starting gunicorn {name}...")
+            process, base_url, log = start_server(config, workdir, env)
+            try:
+                # Warm up lazily loaded processors so the first run is not skewed
+                for kind in args.mix:
+                    send_request(base_url, kind, fixtures, time.monotonic())
+                runs = []
+                for rate in rates:
+                    print(f"  {name}: {rate:g} req/s for {args.duration:g}s")
+                    sampler = RssSampler(process.pid)
+                    sampler.start()
+                    results, elapsed = run_load(base_url, fixtures, rate, args.duration, args.mix)
+                    sampler.stop()
+                    runs.append(dict(summarize_run(results, elapsed, sampler.peaks, sampler.master_peak), rate=rate))
+            finally:
+                stop_server(process, log)
+            report.append({"config": name, "runs": runs, "sustainable_rate": capacity(runs, args.slo)})
+    finally:
+        gemini.shutdown()
+
+    print()
+    print(format_report(report, args.slo, args.node_memory_mb))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
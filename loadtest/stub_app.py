@@ -0,0 +1,32 @@
+"""
+WSGI entry point used by the load-test harness.
+
+Loads the real app but replaces the YouTube download with a local audio
+fixture, so video requests run conversion, transcription and summarization
+without downloading from YouTube. Gemini is stubbed by pointing
+GEMINI_API_URL at the harness's local stand-in server. Whisper still loads
+its model from the local cache (~/.cache/whisper), downloading it on first
+use unless it was fetched beforehand.
+"""
+import os
+import shutil
+import time
+import uuid
+
+from app import app  # noqa: F401  (gunicorn loads loadtest.stub_app:app)
+from video_processor import YouTubeAudioProcessor
+
+AUDIO_FIXTURE = os.environ.get("LOADTEST_AUDIO_FIXTURE")
+YOUTUBE_LATENCY = float(os.environ.get("LOADTEST_YOUTUBE_LATENCY", 0))
+
+
+def _stub_extract_audio_from_youtube(self, url):
+    # Simulate the download time, then hand back a private copy of the fixture
+    # (process_video deletes the audio file when it is done)
+    time.sleep(YOUTUBE_LATENCY)
+    output_audio = os.path.join("downloads", f"youtube_audio_{uuid.uuid4().hex}{os.path.splitext(AUDIO_FIXTURE)[1]}")
+    shutil.copyfile(AUDIO_FIXTURE, output_audio)
+    return output_audio
+
+
+YouTubeAudioProcessor.extract_audio_from_youtube = _stub_extract_audio_from_youtube
@@ -1,7 +1,10 @@
 import os
 import pytesseract
 import fitz  # PyMuPDF
-from utils import setup_tesseract, summarize_text
+from utils import (
+    setup_tesseract, summarize_text, adaptive_ocr, ocr_text_regions, detect_ocr_language, detect_text_regions,
+    OCR_LOW_DPI, OCR_HIGH_DPI, OCR_DEFAULT_LANGUAGE
+)
 
 class PDFProcessor:
     def __init__(self, output_folder="output"):
@@ -9,8 +12,18 @@ class PDFProcessor:
         self.output_folder = output_folder
         os.makedirs(self.output_folder, exist_ok=True)
 
-    def extract_text_with_ocr(self, pdf_path):
+    def extract_text_with_ocr(self, pdf_path, adaptive=False, return_confidence=False):
+        """
+        Extract text from a PDF, falling back to OCR for scanned documents.
+        With `adaptive`, pages are OCR'd at a low DPI first and only pages or
+        lines with low Tesseract confidence are re-rendered at a higher DPI.
+        With `return_confidence`, returns (text, per-page confidence list).
+        Both modes use the language pack for the script detected on the first
+        page with text. Without `adaptive`, only detected text blocks are OCR'd; adaptive
+        mode OCRs whole pages, since it already finds weak lines itself.
+        """
         text = ""
+        confidence = []
         try:
             # First try to extract text directly
             doc = fitz.open(pdf_path)
@@ -33,18 +46,40 @@ class PDFProcessor:
                 print("[OCR] No selectable text found, using OCR (via PyMuPDF)...")
                 import io
                 from PIL import Image
+                # Script detection runs once per document, on the first page with text
+                lang = None
                 for page_num in range(len(doc)):
                     try:
                         page = doc.load_page(page_num)
-                        pix = page.get_pixmap(dpi=150)  # Lower DPI for memory efficiency
-                        img_data = pix.tobytes("png")
-                        img = Image.open(io.BytesIO(img_data))
-                        
-                        text += pytesseract.image_to_string(img) + "\n"
-                        
-                        # Clear memory after each page
-                        del img
-                        del pix
+                        if adaptive:
+                            def render(scale, clip, page=page):
+                                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale),
+                                                      clip=fitz.Rect(clip) if clip else None)
+                                return Image.open(io.BytesIO(pix.tobytes("png")))
+
+                            # Script detection reuses the first-pass render instead of rasterizing again
+                            low_image = render(OCR_LOW_DPI / 72, None)
+                            if lang is None and detect_text_regions(low_image) != []:
+                                lang = detect_ocr_language(pytesseract, low_image) or OCR_DEFAULT_LANGUAGE
+                            page_text, page_info = adaptive_ocr(
+                                pytesseract, render, OCR_LOW_DPI / 72, OCR_HIGH_DPI / 72,
+                                lang=lang or OCR_DEFAULT_LANGUAGE, low_image=low_image
+                            )
+                            page_info["page"] = page_num + 1
+                            confidence.append(page_info)
+                            text += page_text + "\n"
+                        else:
+                            pix = page.get_pixmap(dpi=150)  # Lower DPI for memory efficiency
+                            img_data = pix.tobytes("png")
+                            img = Image.open(io.BytesIO(img_data))
+
+                            if lang is None and detect_text_regions(img) != []:
+                                lang = detect_ocr_language(pytesseract, img) or OCR_DEFAULT_LANGUAGE
+                            text += ocr_text_regions(pytesseract, img, lang=lang or OCR_DEFAULT_LANGUAGE) + "\n"
+
+                            # Clear memory after each page
+                            del img
+                            del pix
                         if page_num % 5 == 0:
                             import gc
                             gc.collect()
@@ -53,7 +88,10 @@ class PDFProcessor:
                         continue
             
             doc.close()
-            return text.strip() if text.strip() else None
+            text = text.strip() if text.strip() else None
+            if return_confidence:
+                return text, confidence
+            return text
             
         except Exception as e:
             print(f"Error extracting text: {e}")
@@ -0,0 +1,198 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+import utils
+
+
+def draw_text_block(draw, left, top, lines, width, fill=0):
+    # Glyph-like strokes: 2px-wide, 14px-tall marks grouped into words
+    for line in range(lines):
+        y = top + line * 30
+        x = left
+        while x < left + width:
+            for _ in range(6):
+                draw.rectangle((x, y, x + 1, y + 13), fill=fill)
+                x += 5
+            x += 12
+
+
+def blank_page(size=(1200, 1600), color=255):
+    return Image.new('L', size, color)
+
+
+def two_column_page():
+    image = blank_page()
+    draw = ImageDraw.Draw(image)
+    draw_text_block(draw, 100, 200, 10, 400)
+    draw_text_block(draw, 700, 200, 12, 300)
+    return image
+
+
+def photo(size=(600, 400)):
+    noise = np.random.default_rng(0).integers(0, 256, (size[1] // 10, size[0] // 10), dtype=np.uint8)
+    return Image.fromarray(noise).resize(size).filter(ImageFilter.GaussianBlur(8))
+
+
+class StubTesseract:
+    """Stands in for pytesseract; 'reads' an image as its size."""
+
+    class Output:
+        DICT = 'dict'
+
+    def __init__(self, conf=90):
+        self.calls = []
+        self.conf = conf
+
+    def image_to_string(self, image, lang='eng', config=''):
+        self.calls.append(('string', image.size, config))
+        return f"{image.size[0]}x{image.size[1]}"
+
+    def image_to_data(self, image, lang='eng', config='', output_type=None):
+        self.calls.append(('data', image.size, config))
+        return {'text': ['banner'], 'conf': [self.conf], 'block_num': [1], 'par_num': [1],
+                'line_num': [1], 'left': [0], 'top': [0], 'width': [10], 'height': [10]}
+
+
+def test_components_labels_connected_runs():
+    grid = np.zeros((6, 8), dtype=bool)
+    grid[0, 0:3] = True
+    grid[1, 2:4] = True  # Touches the run above: same component
+    grid[4:6, 6:8] = True
+    components = sorted(utils._components(grid))
+    assert components == [[0, 0, 2, 4, 5], [4, 6, 6, 8, 4]]
+
+
+def test_reading_order_rows_then_columns():
+    title = (100, 50, 1100, 100)
+    left = (100, 200, 500, 800)
+    right = (700, 200, 1100, 900)
+    footer = (100, 1000, 400, 1050)
+    assert utils._reading_order([footer, right, title, left]) == [title, left, right, footer]
+
+
+def test_detect_two_columns_in_reading_order():
+    regions = utils.detect_text_regions(two_column_page())
+    assert len(regions) == 2
+    (left, right) = regions
+    assert left[0] < 150 and right[0] > 600
+    assert left[2] < right[0]
+
+
+def test_detect_blank_page():
+    assert utils.detect_text_regions(blank_page()) == []
+
+
+def test_detect_skips_photo_block():
+    image = blank_page()
+    image.paste(photo(), (300, 500))
+    draw_text_block(ImageDraw.Draw(image), 300, 950, 1, 500)  # Caption
+    regions = utils.detect_text_regions(image)
+    assert len(regions) == 1
+    assert regions[0][1] > 900
+
+
+def test_inverted_banner_is_found_but_not_text_like():
+    image = blank_page()
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 100, 1100, 300), fill=0)
+    draw_text_block(draw, 200, 180, 1, 600, fill=255)
+    blocks = utils._find_blocks(image)
+    assert len(blocks) == 1 and blocks[0][4] is False
+    assert utils.detect_text_regions(image) == []
+
+
+def test_rgba_text_on_transparent_background():
+    image = Image.new('RGBA', (1200, 1600), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw_text_block(draw, 100, 200, 5, 400, fill=(0, 0, 0, 255))
+    assert len(utils.detect_text_regions(image)) == 1
+
+
+def test_low_contrast_is_undecided():
+    image = two_column_page().point(lambda v: 200 + v * 20 // 255)
+    assert utils.detect_text_regions(image) is None
+
+
+def test_ocr_text_regions_joins_blocks_in_reading_order():
+    image = two_column_page()
+    stub = StubTesseract()
+    text = utils.ocr_text_regions(stub, image)
+    expected = [f"{r - l}x{b - t}" for l, t, r, b in utils.detect_text_regions(image)]
+    assert text.split("\n\n") == expected
+    assert all(config == '--psm 6' for _, _, config in stub.calls)
+
+
+def test_ocr_text_regions_blank_page_skips_ocr():
+    stub = StubTesseract()
+    assert utils.ocr_text_regions(stub, blank_page()) == ""
+    assert stub.calls == []
+
+
+def test_ocr_text_regions_low_contrast_falls_back_to_whole_image():
+    image = two_column_page().point(lambda v: 200 + v * 20 // 255)
+    stub = StubTesseract()
+    utils.ocr_text_regions(stub, image)
+    assert stub.calls == [('string', image.size, '')]
+
+
+def test_ocr_text_regions_dense_page_falls_back_to_whole_image():
+    image = blank_page()
+    draw_text_block(ImageDraw.Draw(image), 20, 20, 52, 1160)
+    stub = StubTesseract()
+    utils.ocr_text_regions(stub, image)
+    assert stub.calls == [('string', image.size, '')]
+
+
+def test_ocr_text_regions_disabled(monkeypatch):
+    monkeypatch.setattr(utils, 'OCR_TEXT_REGIONS', False)
+    stub = StubTesseract()
+    utils.ocr_text_regions(stub, blank_page())
+    assert stub.calls == [('string', (1200, 1600), '')]
+
+
+@pytest.mark.parametrize('conf, expected', [(95, 'banner'), (20, '')])
+def test_ocr_text_regions_keeps_only_confident_text_from_photo_like_blocks(conf, expected):
+    image = blank_page()
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 100, 1100, 300), fill=0)
+    draw_text_block(draw, 200, 180, 1, 600, fill=255)
+    stub = StubTesseract(conf=conf)
+    assert utils.ocr_text_regions(stub, image) == expected
+    assert [kind for kind, _, _ in stub.calls] == ['data']
+
+
+class StubOsd(StubTesseract):
+    def __init__(self, script, languages=('eng', 'osd', 'rus')):
+        super().__init__()
+        self.script = script
+        self.languages = list(languages)
+
+    def get_languages(self, config=''):
+        return self.languages
+
+    def image_to_osd(self, image, output_type=None):
+        self.calls.append(('osd', image.size, ''))
+        if self.script is None:
+            raise Exception("Too few characters")
+        return {'script': self.script}
+
+
+@pytest.mark.parametrize('script, expected', [
+    ('Cyrillic', 'rus'),
+    ('Latin', 'eng'),
+    ('Arabic', 'eng'),  # No Arabic pack installed
+    (None, None),       # Too little text to tell
+])
+def test_detect_ocr_language(monkeypatch, script, expected):
+    monkeypatch.setattr(utils, '_installed_languages', None)
+    stub = StubOsd(script)
+    assert utils.detect_ocr_language(stub, Image.new('L', (2550, 3300), 255)) == expected
+    assert max(stub.calls[0][1]) <= utils.OCR_OSD_MAX_SIDE
+
+
+def test_detect_ocr_language_without_osd_pack(monkeypatch):
+    monkeypatch.setattr(utils, '_installed_languages', None)
+    stub = StubOsd('Cyrillic', languages=('eng', 'rus'))
+    assert utils.detect_ocr_language(stub, blank_page()) == 'eng'
+    assert stub.calls == []
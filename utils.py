@@ -1,4 +1,8 @@
 import os
+import re
+import gzip
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 tesseract_paths = [
     '/usr/bin/tesseract',
@@ -16,6 +20,11 @@ def find_tesseract():
     return None
 
 def setup_tesseract(pytesseract):
+    # Tesseract starts its own OpenMP threads per process; with regions OCR'd in
+    # parallel under gunicorn threads that oversubscribes the cores. pytesseract
+    # passes this module-level environ to its subprocesses only.
+    if 'OMP_THREAD_LIMIT' not in os.environ:
+        pytesseract.pytesseract.environ = dict(os.environ, OMP_THREAD_LIMIT='1')
     tesseract_path = find_tesseract()
     if tesseract_path:
         pytesseract.pytesseract.tesseract_cmd = tesseract_path
@@ -26,20 +35,448 @@ def setup_tesseract(pytesseract):
         for path in tesseract_paths:
             print(f"- {path}")
 
+# Adaptive OCR settings: OCR cheaply first, re-render only what reads badly
+OCR_LOW_DPI = int(os.environ.get("OCR_LOW_DPI", 100))
+OCR_HIGH_DPI = int(os.environ.get("OCR_HIGH_DPI", 300))
+OCR_CONFIDENCE_THRESHOLD = float(os.environ.get("OCR_CONFIDENCE_THRESHOLD", 70))
+OCR_IMAGE_LOW_MAX_SIDE = 1600  # Longest side (px) used for the first image pass
+OCR_REGION_RETRY_RATIO = 0.5   # Above this share of weak lines, re-render the whole page
+OCR_REGION_PADDING = 4         # Padding (page units) around a re-rendered line
+
+# Text-region detection: OCR only the blocks that contain ink
+OCR_TEXT_REGIONS = os.environ.get("OCR_TEXT_REGIONS", "true").lower() in ("1", "true", "yes")
+OCR_DETECT_SCRIPT = os.environ.get("OCR_DETECT_SCRIPT", "true").lower() in ("1", "true", "yes")
+OCR_DEFAULT_LANGUAGE = os.environ.get("OCR_DEFAULT_LANGUAGE", "eng")
+OCR_REGION_WORKERS = int(os.environ.get("OCR_REGION_WORKERS", min(4, os.cpu_count() or 1)))
+OCR_REGION_MAX_COVERAGE = 0.6  # Above this share of the page, OCR the whole page in one call
+OCR_REGION_MIN_CONTRAST = 40   # Gray levels between ink and paper; below this detection is unreliable
+OCR_REGION_MAX_DENSITY = 0.45  # Share of inked pixels above which a block is a photo, not text
+OCR_REGION_MAX_LINE = 0.08     # Tallest unbroken ink band, as a share of the longer image side
+OCR_REGION_MIN_PHOTO_AREA = 0.005  # Photo-like blocks smaller than this share of the page are skipped
+OCR_OSD_MAX_SIDE = 1600        # Script detection runs on a copy no larger than this (px)
+
+def ocr_lines(pytesseract, image, config='', lang=OCR_DEFAULT_LANGUAGE):
+    """
+    OCR an image and group Tesseract's word data into lines.
+    Each line is a dict with its text, mean word confidence, word count,
+    bounding box (left, top, right, bottom) in image pixels and block number.
+    """
+    data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    lines = {}
+    for i, word in enumerate(data['text']):
+        conf = float(data['conf'][i])
+        if conf < 0 or not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        line = lines.get(key)
+        if line is None:
+            lines[key] = {
+                "words": [word.strip()],
+                "confs": [conf],
+                "box": [left, top, right, bottom],
+                "block": key[:2],
+            }
+        else:
+            line["words"].append(word.strip())
+            line["confs"].append(conf)
+            box = line["box"]
+            box[0], box[1] = min(box[0], left), min(box[1], top)
+            box[2], box[3] = max(box[2], right), max(box[3], bottom)
+
+    return [{
+        "text": " ".join(line["words"]),
+        "conf": sum(line["confs"]) / len(line["confs"]),
+        "words": len(line["words"]),
+        "box": tuple(line["box"]),
+        "block": line["block"],
+    } for line in lines.values()]
+
+def _mean_confidence(lines):
+    words = sum(line["words"] for line in lines)
+    if not words:
+        return None
+    return sum(line["conf"] * line["words"] for line in lines) / words
+
+def _join_lines(lines):
+    # Keep paragraphs apart the same way image_to_string does
+    text = ""
+    previous_block = None
+    for line in lines:
+        if previous_block is not None:
+            text += "\n\n" if line["block"] != previous_block else "\n"
+        text += line["text"]
+        previous_block = line["block"]
+    return text
+
+def adaptive_ocr(pytesseract, render, low_scale, high_scale, threshold=OCR_CONFIDENCE_THRESHOLD, lang=OCR_DEFAULT_LANGUAGE,
+                 low_image=None):
+    """
+    OCR a page at low resolution and re-render it at high resolution only where
+    Tesseract's word confidence falls below the threshold.
+
+    `render(scale, clip)` must return a PIL image of the page (or of the
+    `clip` rectangle, given in page units) scaled by `scale`. Pass `low_image`
+    to reuse a first-pass render the caller already has.
+    Returns the text and a dict with the confidence and what was re-rendered.
+    """
+    if low_image is None:
+        low_image = render(low_scale, None)
+    lines = ocr_lines(pytesseract, low_image, lang=lang)
+    for line in lines:
+        line["box"] = tuple(v / low_scale for v in line["box"])
+    confidence = _mean_confidence(lines)
+    rerendered = "none"
+
+    if confidence is None and detect_text_regions(low_image) == []:
+        # No words and no text-like ink: a blank or photo-only page, not worth a retry
+        pass
+    elif confidence is None or confidence < threshold:
+        weak = [line for line in lines if line["conf"] < threshold]
+        # No words at all but visible ink is usually print too small for the low DPI
+        if not lines or len(weak) > len(lines) * OCR_REGION_RETRY_RATIO:
+            # Mostly unreadable: OCR the whole page again at high resolution
+            lines = ocr_lines(pytesseract, render(high_scale, None), lang=lang)
+            rerendered = "page"
+        else:
+            # Only a few weak lines: re-render just those regions
+            for line in weak:
+                left, top, right, bottom = line["box"]
+                clip = (max(0, left - OCR_REGION_PADDING), max(0, top - OCR_REGION_PADDING),
+                        right + OCR_REGION_PADDING, bottom + OCR_REGION_PADDING)
+                retry = ocr_lines(pytesseract, render(high_scale, clip), config='--psm 7', lang=lang)
+                retry_conf = _mean_confidence(retry)
+                if retry_conf is not None and retry_conf > line["conf"]:
+                    line["text"] = " ".join(r["text"] for r in retry)
+                    line["conf"] = retry_conf
+                    line["words"] = sum(r["words"] for r in retry)
+            rerendered = "regions"
+        confidence = _mean_confidence(lines)
+
+    return _join_lines(lines), {
+        "confidence": round(confidence, 1) if confidence is not None else None,
+        "rerendered": rerendered,
+    }
+
+def _otsu_threshold(gray):
+    import numpy as np
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    dark = np.cumsum(hist)
+    light = dark[-1] - dark
+    dark_sum = np.cumsum(hist * levels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dark_mean = dark_sum / dark
+        light_mean = (dark_sum[-1] - dark_sum) / light
+        between = dark * light * (dark_mean - light_mean) ** 2
+    between[(dark == 0) | (light == 0)] = -1
+    threshold = int(np.argmax(between))
+    if between[threshold] < 0:
+        return None, 0
+    return threshold, light_mean[threshold] - dark_mean[threshold]
+
+def _dilate(grid, dx, dy):
+    # Binary dilation by shifting, so characters merge into lines and lines into blocks
+    out = grid.copy()
+    for s in range(1, dx + 1):
+        out[:, s:] |= grid[:, :-s]
+        out[:, :-s] |= grid[:, s:]
+    grid = out.copy()
+    for s in range(1, dy + 1):
+        out[s:, :] |= grid[:-s, :]
+        out[:-s, :] |= grid[s:, :]
+    return out
+
+def _components(grid):
+    """
+    Connected components of a boolean grid, labelled from horizontal runs with
+    union-find. Returns [top, left, bottom, right, cells] per component.
+    """
+    import numpy as np
+    padded = np.zeros((grid.shape[0], grid.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = grid
+    edges = np.diff(padded, axis=1)
+
+    runs, parent, previous = [], [], []
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for row in range(grid.shape[0]):
+        starts = np.flatnonzero(edges[row] == 1)
+        ends = np.flatnonzero(edges[row] == -1)
+        current = []
+        j = 0
+        for start, end in zip(starts, ends):
+            index = len(runs)
+            runs.append((row, start, end))
+            parent.append(index)
+            # Join with every run in the row above that overlaps this one
+            while j < len(previous) and runs[previous[j]][2] <= start:
+                j += 1
+            k = j
+            while k < len(previous) and runs[previous[k]][1] < end:
+                root, other = find(index), find(previous[k])
+                if root != other:
+                    parent[root] = other
+                k += 1
+            current.append(index)
+        previous = current
+
+    boxes = {}
+    for index, (row, start, end) in enumerate(runs):
+        root = find(index)
+        box = boxes.get(root)
+        if box is None:
+            boxes[root] = [row, start, row + 1, end, end - start]
+        else:
+            box[1], box[2] = min(box[1], start), row + 1
+            box[3] = max(box[3], end)
+            box[4] += end - start
+    return list(boxes.values())
+
+def _split_boxes(boxes, axis):
+    # Group boxes whose extents overlap along one axis (0: x, 1: y)
+    boxes = sorted(boxes, key=lambda b: b[axis])
+    groups = [[boxes[0]]]
+    end = boxes[0][axis + 2]
+    for box in boxes[1:]:
+        if box[axis] >= end:
+            groups.append([box])
+            end = box[axis + 2]
+        else:
+            groups[-1].append(box)
+            end = max(end, box[axis + 2])
+    return groups
+
+def _reading_order(boxes):
+    # Recursive XY-cut: rows top to bottom, then columns left to right
+    if len(boxes) <= 1:
+        return boxes
+    for axis in (1, 0):
+        groups = _split_boxes(boxes, axis)
+        if len(groups) > 1:
+            return [box for group in groups for box in _reading_order(group)]
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+def _longest_run(mask):
+    import numpy as np
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return int((ends - starts).max()) if len(starts) else 0
+
+def _looks_like_text(block, max_line):
+    # Text is sparse ink in short bands separated by blank rows; photos are dense and tall
+    if block.mean() > OCR_REGION_MAX_DENSITY:
+        return False
+    return _longest_run(block.mean(axis=1) > 0.02) <= max_line
+
+def _flatten_alpha(image):
+    # Composite transparency onto white, as pytesseract does before OCR, so
+    # colour values hidden under transparent pixels are not read as ink
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        from PIL import Image
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, image).convert('RGB')
+    return image
+
+def _find_blocks(image):
+    """
+    Find ink blocks with connected-component analysis on a coarse ink grid.
+    Returns (left, top, right, bottom, looks_like_text) tuples in reading
+    order, an empty list for a blank image, or None when the contrast is too
+    low to tell.
+    """
+    import numpy as np
+    gray = np.asarray(_flatten_alpha(image).convert('L'), dtype=np.uint8)
+    height, width = gray.shape
+    threshold, contrast = _otsu_threshold(gray)
+    if threshold is None:
+        return []
+    if contrast < OCR_REGION_MIN_CONTRAST:
+        return None
+    ink = gray <= threshold
+    if ink.mean() > 0.5:
+        # Light text on a dark background
+        ink = ~ink
+
+    # Work on cells instead of pixels; scale cells with the image resolution
+    cell = max(4, min(height, width) // 200)
+    rows, cols = -(-height // cell), -(-width // cell)
+    padded = np.zeros((rows * cell, cols * cell), dtype=bool)
+    padded[:height, :width] = ink
+    counts = padded.reshape(rows, cell, cols, cell).sum(axis=(1, 3))
+    join_x, join_y = 2, 1
+    grid = _dilate(counts >= max(2, cell * cell // 20), join_x, join_y)
+
+    max_line = OCR_REGION_MAX_LINE * max(height, width)
+    blocks = []
+    for top, left, bottom, right, cells in _components(grid):
+        if cells <= (2 * join_x + 1) * (2 * join_y + 1):  # A single speck after dilation
+            continue
+        is_text = _looks_like_text(ink[top * cell:bottom * cell, left * cell:right * cell], max_line)
+        blocks.append((max(0, left * cell - cell), max(0, top * cell - cell),
+                       min(width, right * cell + cell), min(height, bottom * cell + cell), is_text))
+    return _reading_order(blocks)
+
+def detect_text_regions(image):
+    """
+    Find text blocks, leaving out photo-like ones. Returns (left, top, right,
+    bottom) pixel boxes in reading order; an empty list means the image has
+    no text, and None means the contrast is too low to tell.
+    """
+    blocks = _find_blocks(image)
+    if blocks is None:
+        return None
+    return [block[:4] for block in blocks if block[4]]
+
+def ocr_text_regions(pytesseract, image, lang=OCR_DEFAULT_LANGUAGE):
+    """
+    OCR only the detected ink blocks of an image, in parallel, and join them
+    in reading order. Falls back to whole-image OCR when blocks cover most of
+    it or the contrast is too low for detection (e.g. faded scans).
+    """
+    if not OCR_TEXT_REGIONS:
+        return pytesseract.image_to_string(image, lang=lang)
+    image = _flatten_alpha(image)
+    blocks = _find_blocks(image)
+    if blocks is None:
+        return pytesseract.image_to_string(image, lang=lang)
+    # Small photo-like blocks are bullets, logos or rules; large ones may hold text
+    min_area = OCR_REGION_MIN_PHOTO_AREA * image.width * image.height
+    blocks = [b for b in blocks if b[4] or (b[2] - b[0]) * (b[3] - b[1]) >= min_area]
+    if not blocks:
+        return ""
+    covered = sum((r - l) * (b - t) for l, t, r, b, _ in blocks)
+    if covered > OCR_REGION_MAX_COVERAGE * image.width * image.height:
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def ocr_block(block):
+        crop = image.crop(block[:4])
+        if block[4]:
+            return pytesseract.image_to_string(crop, lang=lang, config='--psm 6').strip()
+        # Photo-like blocks can still be text (light-on-dark banners, skewed
+        # paragraphs): keep only the lines Tesseract reads confidently
+        lines = ocr_lines(pytesseract, crop, lang=lang)
+        return _join_lines([line for line in lines if line["conf"] >= OCR_CONFIDENCE_THRESHOLD])
+
+    # pytesseract runs Tesseract as a subprocess, so threads OCR regions in parallel
+    with ThreadPoolExecutor(max_workers=OCR_REGION_WORKERS) as pool:
+        texts = list(pool.map(ocr_block, blocks))
+    return "\n\n".join(text for text in texts if text)
+
+# Tesseract OSD script name -> language packs to try, most common first
+_SCRIPT_LANGUAGES = {
+    'Latin': [OCR_DEFAULT_LANGUAGE],
+    'Cyrillic': ['rus', 'ukr', 'bul', 'srp'],
+    'Greek': ['ell'],
+    'Arabic': ['ara', 'fas', 'urd'],
+    'Hebrew': ['heb'],
+    'Devanagari': ['hin', 'mar', 'nep'],
+    'Bengali': ['ben'],
+    'Tamil': ['tam'],
+    'Telugu': ['tel'],
+    'Kannada': ['kan'],
+    'Malayalam': ['mal'],
+    'Gujarati': ['guj'],
+    'Gurmukhi': ['pan'],
+    'Thai': ['tha'],
+    'Han': ['chi_sim', 'chi_tra'],
+    'Japanese': ['jpn'],
+    'Katakana': ['jpn'],
+    'Hiragana': ['jpn'],
+    'Hangul': ['kor'],
+    'Korean': ['kor'],
+}
+_installed_languages = None
+
+def detect_ocr_language(pytesseract, image):
+    """
+    Detect the document's script with Tesseract OSD and return the single
+    installed language pack for it, so Tesseract loads only what is needed.
+    Runs on a downscaled copy; returns None when the image has too little
+    text to tell.
+    """
+    global _installed_languages
+    if not OCR_DETECT_SCRIPT:
+        return OCR_DEFAULT_LANGUAGE
+    if _installed_languages is None:
+        try:
+            _installed_languages = set(pytesseract.get_languages(config=''))
+        except Exception as e:
+            print(f"Could not list Tesseract languages: {str(e)}")
+            _installed_languages = {OCR_DEFAULT_LANGUAGE}
+    if 'osd' not in _installed_languages:
+        return OCR_DEFAULT_LANGUAGE
+    if max(image.size) > OCR_OSD_MAX_SIDE:
+        image = image.copy()
+        image.thumbnail((OCR_OSD_MAX_SIDE, OCR_OSD_MAX_SIDE))
+    try:
+        script = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT).get('script')
+    except Exception as e:
+        # OSD needs a fair amount of text, e.g. it fails on cover pages
+        print(f"[OCR] Script detection skipped: {str(e)}")
+        return None
+    for lang in _SCRIPT_LANGUAGES.get(script, []):
+        if lang in _installed_languages:
+            print(f"[OCR] Detected {script} script, using '{lang}' language pack")
+            return lang
+    return OCR_DEFAULT_LANGUAGE
+
+# All markdown cleanup rules in one compiled pattern so summaries are scanned once
+_MARKDOWN_RE = re.compile(
+    r'(?P<gap>\n(?:[ \t]*(?:[-*_]{3,}[ \t]*)?\n)+)'  # Blank lines and horizontal rules
+    r'|(?P<rule>^[-*_]{3,}[ \t]*$)'                    # Horizontal rule on the first line
+    r'|^#{1,6}[ \t]+(?P<header>.*?)[ \t]*$'            # ### Header -> Header
+    r'|\*\*+(?P<bold>.*?)\*\*+'                         # **bold** -> bold
+    r'|\*+(?P<italic>.*?)\*+'                           # *italic* -> italic
+    r'|\[(?P<link>.*?)\]\(.*?\)',                       # [text](url) -> text
+    re.MULTILINE
+)
+
+def _replace_markdown(match):
+    if match.group('gap') is not None:
+        return '\n\n'
+    if match.group('rule') is not None:
+        return ''
+    inner = next(g for g in match.group('header', 'bold', 'italic', 'link') if g is not None)
+    # Markup can be nested (e.g. a bold link inside a header)
+    return _MARKDOWN_RE.sub(_replace_markdown, inner)
+
 def clean_markdown(text):
-    import re
-    # 1. Remove bold/italic markers (**bold** or *italic*)
-    text = re.sub(r'\*\*+(.*?)\*\*+', r'\1', text)
-    text = re.sub(r'\*+(.*?)\*+', r'\1', text)
-    # 2. Remove headers (### Header -> Header)
-    text = re.sub(r'(?m)^#{1,6}\s+(.*?)\s*$', r'\1', text)
-    # 3. Remove horizontal rules (---)
-    text = re.sub(r'(?m)^[-*_]{3,}\s*$', r'', text)
-    # 4. Remove links ([text](url) -> text)
-    text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)
-    # 5. Clean up multiple empty lines
-    text = re.sub(r'\n{3,}', r'\n\n', text)
-    return text.strip()
+    return _MARKDOWN_RE.sub(_replace_markdown, text).strip()
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+def _write_atomic(path, data):
+    # Readers see either the old file or the complete new one, never a partial write
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def write_text_resource(text, path):
+    """
+    Write a text result once, plus precompressed .gz (and .br when brotli is
+    installed) copies so downloads never recompress it per request.
+    Each file is written to a temporary path and renamed into place.
+    Returns the size of the uncompressed file in bytes.
+    """
+    data = text.encode('utf-8')
+    _write_atomic(path + '.gz', gzip.compress(data, compresslevel=6))
+    if HAS_BROTLI:
+        _write_atomic(path + '.br', brotli.compress(data, quality=5))
+    _write_atomic(path, data)
+    return len(data)
 
 # Lazy-loaded Transformers check and pipeline
 try:
@@ -50,6 +487,12 @@ except ImportError:
 
 _summarizer = None
 
+# Overridable so load tests can point summarization at a local stand-in
+GEMINI_API_URL = os.environ.get(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1/models/gemini-3.5-flash:generateContent"
+)
+
 def get_summarizer():
     global _summarizer
     if _summarizer is None and HAS_TRANSFORMERS:
@@ -76,7 +519,7 @@ def summarize_text(text):
         print("Using cloud-based Gemini API for professional summarization...")
         import requests
         try:
-            url = f"https://generativelanguage.googleapis.com/v1/models/gemini-3.5-flash:generateContent?key={api_key}"
+            url = f"{GEMINI_API_URL}?key={api_key}"
             headers = {'Content-Type': 'application/json'}
             prompt = (
                 "You are a professional summary generator. Please analyze the following text and provide "